@@ -15,11 +15,29 @@ def approval_program():
     deposit_balance   = Bytes("balance") # TealType.uint64
     deposit_timestamp = Bytes("d_timestamp") # TealType.uint64
 
+    # NOTE single opcode reads (Global.* fields, Txn.sender() and other txn fields) cost the same as a
+    # scratch load, so they are read inline rather than cached. Only values that take more than one
+    # opcode and repeat (Btoi of an arg, app_global_get/app_local_get state reads) are kept in scratch.
+
     # operations
-    op_contract_opt_in_vault_asset = Bytes("contract_opt_in_vault_asset") # handled in optin
-    op_usr_opt_in                  = Bytes("usr_opt_in")                  # handled in optin
-    op_usr_deposit                 = Bytes("usr_deposit")                 # handled in noop
-    op_usr_withdrawal              = Bytes("usr_withdrawal")              # handled in noop
+    # one byte selectors sent in Txn.application_args[0], compared directly so only that exact byte matches
+    op_usr_deposit                 = Bytes("base16", "01") # handled in noop
+    op_usr_withdrawal              = Bytes("base16", "02") # handled in noop
+    op_usr_opt_in                  = Bytes("base16", "03") # handled in optin
+    op_contract_opt_in_vault_asset = Bytes("base16", "04") # handled in optin
+
+    # summary: sanity checks shared by every operation, returns 1 if all pass else 0
+    # - txn type is expected_type
+    # - tx is not part of a group
+    # - rekey set to zero address
+    @Subroutine(TealType.uint64)
+    def basic_sanity(expected_type: Expr):
+        return And(
+            Txn.type_enum() == expected_type,
+            Global.group_size() == Int(1),
+            Txn.group_index() == Int(0),
+            Txn.rekey_to() == Global.zero_address(),
+        )
 
     # Summary: opts contract into an asset
     # fees paid with caller tx fees (2 * min_fee)
@@ -29,7 +47,7 @@ def approval_program():
     # - assets[0] exists and is equivalent to vault_asset 
     # preconditions:
     # - Txn.type_enum() == TxnType.ApplicationCall
-    # - param: asset_id = App.globalGet(asset_global_var) is already set 
+    # - param: asset_key is the global var holding the asset id, App.globalGet(asset_key) is already set
     # - contract is not already opted into this asset
     # - sender is the creator of the contract
     # - tx is not part of a group
@@ -38,25 +56,26 @@ def approval_program():
     # postconditions:
     # - contract opted into specified asset 
     @Subroutine(TealType.none)
-    def contract_opt_in_asset(asset_id: Expr):
+    def contract_opt_in_asset(asset_key: Expr):
         asset_opt_in_check = AssetHolding.balance(Global.current_application_address(), Int(0)) # requires index into asset array (Int(0))
+        # NOTE each Assert condition compiles to its own assert opcode, cheap txn field checks
+        # come first, then global state, and the asset holding lookup runs last
         return Seq(
-            asset_opt_in_check,
             Assert(
-                And(
-                    # sanity checks
-                    Txn.type_enum() == TxnType.ApplicationCall,
-                    Global.group_size() == Int(1),
-                    Txn.group_index() == Int(0),
-                    Txn.rekey_to() == Global.zero_address(),
+                # sanity checks
+                basic_sanity(TxnType.ApplicationCall),
+                Txn.fee() >= Global.min_txn_fee() * Int(2),
 
-                    # logic checks
-                    Txn.assets.length() == Int(1), # make sure assets array is length one assets[0] should be asset_id
-                    Txn.assets[0] == asset_id, # check asset in array at index 0 is indeed equal to the subroutines asset_id
-                    asset_opt_in_check.hasValue() == Int(0), # finally check if contracts balance of asset is 0 -> not opted into asset
-                    Txn.sender() == App.globalGet(creator),
-                    Txn.fee() >= Global.min_txn_fee() * Int(2),
-                )
+                # logic checks
+                Txn.assets.length() == Int(1), # make sure assets array is length one assets[0] should be the asset id in asset_key
+            ),
+            Assert(
+                Txn.assets[0] == App.globalGet(asset_key), # check asset in array at index 0 is indeed equal to the asset id stored under asset_key
+                Txn.sender() == App.globalGet(creator),
+            ),
+            asset_opt_in_check,
+            Assert(
+                asset_opt_in_check.hasValue() == Int(0), # finally check if contracts balance of asset is 0 -> not opted into asset
             ),
             # have contract opt-in to vault asset (Txn.assets[0]) via inner tx
             InnerTxnBuilder.Begin(),
@@ -65,7 +84,7 @@ def approval_program():
                 TxnField.asset_receiver: Global.current_application_address(),
                 TxnField.asset_amount: Int(0), # opt-in tx sends 0 of asset to itself
                 TxnField.fee: Int(0), # zero fee takes caller tx fee to pay for inner tx
-                TxnField.xfer_asset: asset_id, 
+                TxnField.xfer_asset: Txn.assets[0], # asserted equal to App.globalGet(asset_key) above
             }),
             InnerTxnBuilder.Submit(),
             Approve()
@@ -82,17 +101,12 @@ def approval_program():
     def usr_opt_in():
         return Seq(
             Assert(
-                And(
-                    # sanity checks
-                    Txn.type_enum() == TxnType.ApplicationCall,
-                    Global.group_size() == Int(1),
-                    Txn.group_index() == Int(0),
-                    Txn.rekey_to() == Global.zero_address(),
-                    
-                    # logic checks
-                    Not(App.optedIn(Txn.sender(), Global.current_application_id())),
-                    #Txn.fee() >= Global.min_txn_fee(),
-                )
+                # sanity checks
+                basic_sanity(TxnType.ApplicationCall),
+
+                # logic checks
+                Not(App.optedIn(Txn.sender(), Global.current_application_id())),
+                #Txn.fee() >= Global.min_txn_fee(),
             ),
             App.localPut(Txn.sender(), deposit_balance, Int(0)),
             App.localPut(Txn.sender(), deposit_timestamp, Int(0)),
@@ -105,7 +119,7 @@ def approval_program():
     # users deposit timestamp is set to current
     # preconditions:
     # - sanity checks and asset_close_to == Global.zero_address
-    # - user is opted in contract
+    # - user is opted in contract (enforced by App.localGet, which fails for non opted in accounts)
     # - txn type is asset transfer
     # - asset receiver is contract address
     # - asset ID being sent is the vault_asset declared in global state (vault_asset)
@@ -118,24 +132,17 @@ def approval_program():
     def usr_deposit():
         return Seq(
             Assert(
-                And(
-
-                    # sanity checks
-                    Txn.type_enum() == TxnType.AssetTransfer,
-                    Global.group_size() == Int(1),
-                    Txn.group_index() == Int(0),
-                    Txn.rekey_to() == Global.zero_address(),
-                    Txn.asset_close_to() == Global.zero_address(), 
+                # sanity checks
+                basic_sanity(TxnType.AssetTransfer),
+                Txn.asset_close_to() == Global.zero_address(), 
+                Txn.fee() >= Global.min_txn_fee(),
 
-                    # logic checks
-                    # is txn.sender() == txn.asset_sender()??
-                    # check if user is opted into asset being sent??
-                    App.optedIn(Txn.sender(), Global.current_application_id()),
-                    Txn.asset_receiver() == Global.current_application_address(),
-                    Txn.xfer_asset() == App.globalGet(vault_asset),
-                    Txn.asset_amount() > Int(0),
-                    Txn.fee() >= Global.min_txn_fee(),
-                )
+                # logic checks
+                # is txn.sender() == txn.asset_sender()??
+                # check if user is opted into asset being sent??
+                Txn.asset_receiver() == Global.current_application_address(),
+                Txn.asset_amount() > Int(0),
+                Txn.xfer_asset() == App.globalGet(vault_asset),
             ),
             # increment senders vault_asset by asset_amount
             App.localPut(Txn.sender(), deposit_balance, App.localGet(Txn.sender(), deposit_balance) + Txn.asset_amount()),
@@ -145,8 +152,8 @@ def approval_program():
         )
 
     # summary:
-    # Txn.application_args[0] = Bytes("usr_withdrawal") 
-    # Txn.application_args[1] = amount
+    # Txn.application_args[0] = op_usr_withdrawal (0x02)
+    # Txn.application_args[1] = amount, big-endian uint64 (same layout as an ABI uint64), decoded once with Btoi
     # Txn.assets[0] = vault_asset
     # deduct withdrawal amount from users local deposit amount
     # asset transfer requested amount to user, use pooling fees (caller pays for call and inner tx)
@@ -154,7 +161,7 @@ def approval_program():
     # - sanity checks
     # - applications args contain the withdrawal operation ([0]) and withdrawal amount ([1])
     # - TXn.assets[0] is the asset user wants to withdrawal, in this case we assert it is the vault asset
-    # - user is opted in 
+    # - user is opted in (enforced by App.localGet, which fails for non opted in accounts)
     # - withdrawal amount is > 0 and <= deposit_balance
     # - fees in caller tx is twice that of the global min tx fee. pays for caller and inner tx via fee pooling
     # postconditions:
@@ -163,35 +170,36 @@ def approval_program():
     # - user's deposit timestamp is invariant
     @Subroutine(TealType.none)
     def usr_withdrawal():
-        temp = ScratchVar(TealType.uint64)
+        amt    = ScratchVar(TealType.uint64)
+        bal    = ScratchVar(TealType.uint64)
         return Seq(
             Assert(
-                And(
-                    # sanity checks
-                    Txn.type_enum() == TxnType.ApplicationCall,
-                    Global.group_size() == Int(1),
-                    Txn.group_index() == Int(0),
-                    Txn.rekey_to() == Global.zero_address(),
+                # sanity checks
+                basic_sanity(TxnType.ApplicationCall),
+                Txn.fee() >= Global.min_txn_fee() * Int(2),
 
-                    # logic checks
-                    Txn.application_args.length() == Int(2),
-                    Txn.assets.length() == Int(1),
-                    App.optedIn(Txn.sender(), Global.current_application_id()),
-                    Txn.assets[0] == App.globalGet(vault_asset),
-                    Btoi(Txn.application_args[1]) > Int(0), 
-                    Btoi(Txn.application_args[1]) <= App.localGet(Txn.sender(), deposit_balance), 
-                    Txn.fee() >= Global.min_txn_fee() * Int(2),
-                )
+                # logic checks
+                Txn.application_args.length() == Int(2),
+                Txn.assets.length() == Int(1),
+            ),
+            # cache withdrawal amount and balance, each is decoded/read once and reused below
+            amt.store(Btoi(Txn.application_args[1])),
+            Assert(
+                amt.load() > Int(0), 
+                Txn.assets[0] == App.globalGet(vault_asset),
+            ),
+            bal.store(App.localGet(Txn.sender(), deposit_balance)),
+            Assert(
+                amt.load() <= bal.load(), 
             ),
             # deduct user deposit_balance by amount specified in Txn.appllication_args[1]
-            temp.store(App.localGet(Txn.sender(), deposit_balance)),
-            App.localPut(Txn.sender(), deposit_balance, temp.load() - Btoi(Txn.application_args[1])),
+            App.localPut(Txn.sender(), deposit_balance, bal.load() - amt.load()),
             # create and transfer asset via inner txn
             InnerTxnBuilder.Begin(),
             InnerTxnBuilder.SetFields({
                 TxnField.type_enum: TxnType.AssetTransfer,
                 TxnField.asset_receiver: Txn.sender(),
-                TxnField.asset_amount: Btoi(Txn.application_args[1]),
+                TxnField.asset_amount: amt.load(),
                 TxnField.fee: Int(0), # zero fee takes caller tx fee to pay for inner tx (fee pooling)
                 TxnField.xfer_asset: Txn.assets[0], 
             }),
@@ -207,10 +215,8 @@ def approval_program():
     # - glabal vars: creator, city, max/min thresholds, vault asset ID and creation timestamp initialized
     handle_creation = Seq(
         Assert(
-            And(
-                Txn.application_args.length() == Int(3),
-                Txn.assets.length() == Int(1),
-            )
+            Txn.application_args.length() == Int(3),
+            Txn.assets.length() == Int(1),
         ),
         App.globalPut(creator, Txn.sender()),
         App.globalPut(city, Txn.application_args[0]),
@@ -221,11 +227,14 @@ def approval_program():
         Approve(),
     )
 
+    # NOTE the trailing Reject() is never executed (matched arms Approve() inside the subroutine,
+    # unmatched selectors hit Cond's implicit err) but PyTeal does not treat a subroutine call as a
+    # return, so it is required for the main program to compile and costs only int 0; return.
     handle_optin = Seq(
         Cond(
-            [Txn.application_args[0] == op_contract_opt_in_vault_asset, contract_opt_in_asset(App.globalGet(vault_asset))],
+            [Txn.application_args[0] == op_usr_opt_in, usr_opt_in()],
+            [Txn.application_args[0] == op_contract_opt_in_vault_asset, contract_opt_in_asset(vault_asset)],
             # other contract asset optins go here
-            [Txn.application_args[0] == op_usr_opt_in, usr_opt_in()]
         ), 
         Reject(),
     )
@@ -244,18 +253,25 @@ def approval_program():
 
     handle_closeout = Err()
 
+    # creation must stay first (it is also a NoOp), then the hot NoOp path
     program = Cond(
         [Txn.application_id() == Int(0), handle_creation],
+        [Txn.on_completion() == OnComplete.NoOp, handle_noop],
         [Txn.on_completion() == OnComplete.OptIn, handle_optin],
         [Txn.on_completion() == OnComplete.CloseOut, handle_closeout],
         [Txn.on_completion() == OnComplete.UpdateApplication, handle_updateapp],
         [Txn.on_completion() == OnComplete.DeleteApplication, handle_deleteapp],
-        [Txn.on_completion() == OnComplete.NoOp, handle_noop],
     )
     # Mode.Application specifies that this is a smart contract
-    return compileTeal(program, Mode.Application, version=5)
+    # scratch_slots optimization lets the compiler drop redundant store/load pairs, frame_pointers
+    # passes subroutine args on the stack with proto/frame_dig instead of scratch slots,
+    # assembleConstants pools int/byte constants into intcblock/bytecblock
+    return compileTeal(program, Mode.Application, version=10, assembleConstants=True, optimize=OptimizeOptions(scratch_slots=True, frame_pointers=True))
 
 def clear_state_program():
     program = Return(Int(1))
     # Mode.Application specifies that this is a smart contract
-    return compileTeal(program, Mode.Application, version=5)
+    # scratch_slots optimization lets the compiler drop redundant store/load pairs, frame_pointers
+    # passes subroutine args on the stack with proto/frame_dig instead of scratch slots,
+    # assembleConstants pools int/byte constants into intcblock/bytecblock
+    return compileTeal(program, Mode.Application, version=10, assembleConstants=True, optimize=OptimizeOptions(scratch_slots=True, frame_pointers=True))